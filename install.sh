@@ -214,8 +214,8 @@ main() {
   mkdir -p "$col_dir/roles"
   "$ANSIBLE_VENV_DIR/bin/ansible-galaxy" role install -r "$req_file" -p "$col_dir/roles" -f || true
 
-  log "[*] Installing Reporting dependencies (pandas, fpdf2)..."
-  "$venv_python" -m pip install --upgrade pandas fpdf2
+  log "[*] Installing Reporting dependencies (pandas, fpdf2, orjson, pysimdjson)..."
+  "$venv_python" -m pip install --upgrade pandas fpdf2 orjson pysimdjson
 
   cat <<EOF
 
@@ -1,10 +1,20 @@
 
-import json
+import orjson
 import sys
 import os
+import pickle
+import tempfile
 from fpdf import FPDF
 from fpdf.enums import XPos, YPos
+from fpdf.fonts import FontFace
 from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
 
 # A4 width is 210mm.
 # Margins approx 10mm each side => ~190mm writable.
@@ -17,52 +27,166 @@ WRITABLE_WIDTH = PAGE_WIDTH - MARGIN_LEFT - MARGIN_RIGHT
 COL_WIDTH_STATUS = 30
 COL_WIDTH_CHANGED = 20
 COL_WIDTH_TASK = WRITABLE_WIDTH - COL_WIDTH_STATUS - COL_WIDTH_CHANGED
+TASK_NAME_MAX_LEN = 90
+TASK_HEADINGS_STYLE = FontFace(emphasis='BOLD', size_pt=10, fill_color=(220, 220, 220))
+
+# Mounts at or below this size are left out of the Storage line
+GIB = 1 << 30
+
+# Task status by severity; a task with no host results counts as SKIPPED
+TASK_STATUS = ("SKIPPED", "OK", "UNREACHABLE", "FAILED")
 
+# Role-prefixed task names look like "role : task"
+TASK_NAME_SEP = ' : '
+
+@lru_cache(maxsize=4096)
 def clean_task_name(task_name):
-    if ' : ' in task_name:
-        parts = task_name.split(' : ', 1)
-        return parts[1]
-    return task_name
+    _, sep, name = task_name.partition(TASK_NAME_SEP)
+    return name if sep else task_name
+
+def truncate_task_name(task_name):
+    if len(task_name) <= TASK_NAME_MAX_LEN:
+        return task_name
+    return task_name[:TASK_NAME_MAX_LEN - 3] + "..."
+
+def load_playbook_json(playbook_json_file):
+    raw = Path(playbook_json_file).read_bytes()
+    # Lazy parse: only the fields we read get turned into Python objects.
+    # Iterate simdjson objects by key; .items()/.values() materialize them.
+    if simdjson is not None:
+        return simdjson.Parser().parse(raw)
+    return orjson.loads(raw)
+
+def load_facts_json(facts_file, cache_dir=None):
+    if not cache_dir:
+        return orjson.loads(Path(facts_file).read_bytes())
+    # Parsed facts are memoized on disk, keyed by file name, mtime and size.
+    # pickle.load runs code from the cache, so cache_dir must be trusted.
+    st = os.stat(facts_file)
+    cache_path = os.path.join(cache_dir, f"{os.path.basename(facts_file)}.{st.st_mtime_ns}.{st.st_size}.pkl")
+    try:
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        pass
+    except (pickle.UnpicklingError, EOFError, ValueError) as e:
+        # Corrupt entry: re-parse and overwrite it below
+        print(f"Ignoring unreadable facts cache {cache_path}: {e}")
+    raw_facts = orjson.loads(Path(facts_file).read_bytes())
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temp file and rename, so a killed or racing run never
+    # leaves a truncated entry under the final name
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(raw_facts, f, protocol=5)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Could not write facts cache {cache_path}: {e}")
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+    return raw_facts
+
+def to_python(value):
+    # simdjson proxies stay bound to their parser; copy out what we keep
+    if hasattr(value, 'as_dict'):
+        return value.as_dict()
+    return value
+
+def iter_tasks(playbook_data, facts_data):
+    # Yields one report row per task. If facts_data is still empty, it is
+    # filled in place from the gather_facts results (setup fallback).
+    if 'plays' not in playbook_data:
+        return
+    _clean = clean_task_name
+    for play in playbook_data['plays']:
+        for task in play['tasks']:
+            task_info = task['task']
+            task_name_raw = task_info['name']
+            is_gathering = task_name_raw == "Gathering Facts"
+            if not facts_data and (is_gathering or task_info['action'] == 'gather_facts'):
+                hosts_res = task['hosts']
+                for host in hosts_res:
+                    res = hosts_res[host]
+                    if 'ansible_facts' in res:
+                        print("Using fallback facts from playbook output...")
+                        facts_data.update(to_python(res['ansible_facts']))
+                        break
+            if is_gathering: continue
+
+            hosts_res = task['hosts']
+            status_idx = 0
+            changed = False
+
+            for h in hosts_res:
+                res = hosts_res[h]
+                # Worst result across hosts wins (see TASK_STATUS)
+                idx = 3 if res.get('failed') else 2 if res.get('unreachable') else 0 if res.get('skipped') else 1
+                if idx > status_idx: status_idx = idx
+                if res.get('changed'): changed = True
+                if status_idx == 3 and changed: break
+
+            yield {
+                "task": _clean(task_name_raw),
+                "status": TASK_STATUS[status_idx],
+                "changed": "Yes" if changed else "No"
+            }
+
+class PDF(FPDF):
+    def header(self):
+        # Bold title
+        self.set_font('Helvetica', 'B', 16)
+        self.cell(0, 10, 'Hardening Report', border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+        self.line(MARGIN_LEFT, 20, PAGE_WIDTH - MARGIN_RIGHT, 20)
+        self.ln(10)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Helvetica', 'I', 8)
+        self.cell(0, 10, f'Page {self.page_no()}', border=0, new_x=XPos.RIGHT, new_y=YPos.TOP, align='C')
+
+    def chapter_title(self, label):
+        self.set_font('Helvetica', 'B', 12)
+        # Light grey background
+        self.set_fill_color(240, 240, 240)
+        self.cell(0, 8, f"  {label}", border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L', fill=True)
+        self.ln(2)
 
 def generate_report(playbook_json_file, facts_file, report_dir):
     # 1. READ PLAYBOOK OUTPUT
     try:
-        with open(playbook_json_file, 'r') as f:
-            playbook_data = json.load(f)
+        playbook_data = load_playbook_json(playbook_json_file)
     except Exception as e:
         print(f"Error loading playbook json: {e}")
-        return
+        return False
 
     # 2. READ FACTS
     facts_data = {}
     fact_error = None
-    if facts_file and facts_file != "none" and os.path.exists(facts_file):
+    if facts_file and facts_file != "none":
         try:
-             with open(facts_file, 'r') as f:
-                raw_facts = json.load(f)
-                if 'ansible_facts' in raw_facts:
-                    facts_data = raw_facts['ansible_facts']
-                elif raw_facts.get('unreachable'):
-                    fact_error = f"UNREACHABLE: {raw_facts.get('msg', 'Unknown Error')}"
-                elif raw_facts.get('failed'):
-                    fact_error = f"FAILED: {raw_facts.get('msg', 'Unknown Error')}"
+            # REPORT_CACHE=1 enables the parsed-facts cache under <report_dir>/.cache
+            # (a trusted directory: cache entries are unpickled)
+            cache_dir = os.path.join(report_dir, ".cache") if os.environ.get('REPORT_CACHE') else None
+            raw_facts = load_facts_json(facts_file, cache_dir)
+            if 'ansible_facts' in raw_facts:
+                facts_data = raw_facts['ansible_facts']
+            elif raw_facts.get('unreachable'):
+                fact_error = f"UNREACHABLE: {raw_facts.get('msg', 'Unknown Error')}"
+            elif raw_facts.get('failed'):
+                fact_error = f"FAILED: {raw_facts.get('msg', 'Unknown Error')}"
+        except FileNotFoundError:
+            pass
         except Exception as e:
             print(f"Error loading facts file: {e}")
 
-    # FALLBACK: Try to find facts in playbook execution if setup failed
-    if (not facts_data) and ('plays' in playbook_data):
-        print("Using fallback facts from playbook output...")
-        for play in playbook_data['plays']:
-            for task in play['tasks']:
-                 # We want the 'gather_facts' task results
-                if task['task']['name'] == 'Gathering Facts' or task['task']['action'] == 'gather_facts':
-                    for host, res in task['hosts'].items():
-                        if 'ansible_facts' in res:
-                            facts_data = res['ansible_facts']
-                            fact_error = None
-                            break
-                if facts_data: break
-            if facts_data: break
+    # Tasks Processing - SEQUENTIAL
+    # Drained once; the same list feeds the JSON dump and the PDF table
+    sequential_tasks = list(iter_tasks(playbook_data, facts_data))
+    if facts_data:
+        fact_error = None
 
     # 3. EXTRACTION for Report
     mem_total_mb = facts_data.get('ansible_memtotal_mb', 0)
@@ -77,27 +201,18 @@ def generate_report(playbook_json_file, facts_file, report_dir):
         
     cpu_cores = facts_data.get('ansible_processor_vcpus', 1)
 
-    mounts = facts_data.get('ansible_mounts', [])
     storage_info = []
-    for m in mounts:
-        if m.get('size_total', 0) > 1073741824: # > 1GB
-            size_gb = round(m['size_total'] / (1024**3), 2)
-            storage_info.append(f"{m['mount']} ({size_gb} GB)")
+    for m in facts_data.get('ansible_mounts', ()):
+        size_total = m.get('size_total', 0)
+        if size_total <= GIB: continue
+        storage_info.append(f"{m['mount']} ({round(size_total / GIB, 2)} GB)")
     storage_str = ", ".join(storage_info)
 
-    interfaces = []
-    for iface in facts_data.get('ansible_interfaces', []):
-        if iface == 'lo': continue
-        key = f"ansible_{iface}"
-        if key in facts_data:
-            details = facts_data[key]
-            ipv4 = details.get('ipv4', {})
-            addr = ipv4.get('address', 'N/A')
-            mac = details.get('macaddress', 'N/A')
-            interfaces.append(f"{iface}: {addr} ({mac})")
-            
-    net_str = "\n".join(interfaces)
-
+    interfaces = [
+        f"{iface}: {details.get('ipv4', {}).get('address', 'N/A')} ({details.get('macaddress', 'N/A')})"
+        for iface in facts_data.get('ansible_interfaces', ())
+        if iface != 'lo' and (details := facts_data.get(f"ansible_{iface}")) is not None
+    ]
     net_str = "\n".join(interfaces)
 
     hostname_val = facts_data.get('ansible_hostname') or "N/A"
@@ -115,75 +230,30 @@ def generate_report(playbook_json_file, facts_file, report_dir):
         "Network": net_str
     }
 
-    # Tasks Processing - SEQUENTIAL
-    sequential_tasks = []
-    if 'plays' in playbook_data:
-        for play in playbook_data['plays']:
-            for task in play['tasks']:
-                task_name_raw = task['task']['name']
-                task_name_clean = clean_task_name(task_name_raw)
-                
-                hosts_res = task['hosts']
-                status = "SKIPPED"
-                changed = "No"
-                
-                for h, res in hosts_res.items():
-                    if res.get('failed'): status = "FAILED"
-                    elif res.get('unreachable'): status = "UNREACHABLE"
-                    elif res.get('skipped') and status != "FAILED": status = "SKIPPED"
-                    else: status = "OK" 
-                    
-                    if res.get('changed'): changed = "Yes"
-                
-                if task_name_raw == "Gathering Facts": continue 
-                
-                sequential_tasks.append({
-                    "task": task_name_clean,
-                    "status": status,
-                    "changed": changed
-                })
-
-    # 4. MERGE JSON
-    final_json = {
-        "timestamp": datetime.now().isoformat(),
-        "system_info": system_info,
-        "playbook_execution": sequential_tasks
-    }
-    
-    final_json_path = os.path.join(report_dir, "final_report.json")
-    with open(final_json_path, 'w') as f:
-        json.dump(final_json, f, indent=4)
-    print(f"Unified JSON Report: {final_json_path}")
+    # One clock read for both reports, so their timestamps match
+    now = datetime.now()
 
-    # 5. GENERATE PDF
-    class PDF(FPDF):
-        def header(self):
-            # Bold title
-            self.set_font('Helvetica', 'B', 16)
-            self.cell(0, 10, 'Hardening Report', border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
-            self.line(MARGIN_LEFT, 20, PAGE_WIDTH - MARGIN_RIGHT, 20)
-            self.ln(10)
-
-        def footer(self):
-            self.set_y(-15)
-            self.set_font('Helvetica', 'I', 8)
-            self.cell(0, 10, f'Page {self.page_no()}/{{nb}}', border=0, new_x=XPos.RIGHT, new_y=YPos.TOP, align='C')
-            
-        def chapter_title(self, label):
-            self.set_font('Helvetica', 'B', 12)
-            # Light grey background
-            self.set_fill_color(240, 240, 240)
-            self.cell(0, 8, f"  {label}", border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L', fill=True)
-            self.ln(2)
+    # 4. MERGE JSON (EMIT_JSON=0 skips it when only the PDF is wanted)
+    if os.environ.get('EMIT_JSON', '1') != '0':
+        final_json = {
+            "timestamp": now,
+            "system_info": system_info,
+            "playbook_execution": sequential_tasks
+        }
+
+        final_json_path = os.path.join(report_dir, "final_report.json")
+        with open(final_json_path, 'wb') as f:
+            f.write(orjson.dumps(final_json, option=orjson.OPT_INDENT_2))
+        print(f"Unified JSON Report: {final_json_path}")
 
+    # 5. GENERATE PDF
     pdf_file = os.path.join(report_dir, "report.pdf")
     pdf = PDF()
-    pdf.alias_nb_pages()
     pdf.add_page()
     
     # -- METADATA --
     pdf.set_font('Helvetica', '', 10)
-    pdf.cell(0, 6, f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R')
+    pdf.cell(0, 6, f"Date: {now.strftime('%Y-%m-%d %H:%M:%S')}", border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R')
     pdf.ln(5)
 
     # -- SYSTEM INFO TABLE --
@@ -222,37 +292,57 @@ def generate_report(playbook_json_file, facts_file, report_dir):
     # -- TASKS TABLE (Sequential) --
     pdf.chapter_title('Task Execution Details')
     
-    # Table Header
-    pdf.set_fill_color(220, 220, 220)
-    pdf.set_font('Helvetica', 'B', 10)
-    
-    pdf.cell(COL_WIDTH_TASK, 8, "Task", border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='C', fill=True)
-    pdf.cell(COL_WIDTH_STATUS, 8, "Status", border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='C', fill=True)
-    pdf.cell(COL_WIDTH_CHANGED, 8, "Chg", border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C', fill=True)
-    
     pdf.set_font('Helvetica', '', 9)
     # Ensure black text for all
     pdf.set_text_color(0, 0, 0)
-    
-    for t in sequential_tasks:
-        task_name = t['task']
-        status = t['status']
-        changed = t['changed']
-        
-        # Truncate very long task names
-        if len(task_name) > 90: 
-            task_name = task_name[:87] + "..."
-        
+
+    # Truncate very long task names up front (the JSON keeps them whole),
+    # so the row loop below is pure emission
+    task_rows = [(truncate_task_name(t['task']), t['status'], t['changed']) for t in sequential_tasks]
+
+    # Table Header
+    with pdf.use_font_face(TASK_HEADINGS_STYLE):
+        pdf.cell(COL_WIDTH_TASK, 8, "Task", border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='C', fill=True)
+        pdf.cell(COL_WIDTH_STATUS, 8, "Status", border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='C', fill=True)
+        pdf.cell(COL_WIDTH_CHANGED, 8, "Chg", border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C', fill=True)
+
+    for task_name, status, changed in task_rows:
         pdf.cell(COL_WIDTH_TASK, 7, f"  {task_name}", border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='L')
         pdf.cell(COL_WIDTH_STATUS, 7, status, border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='C')
         pdf.cell(COL_WIDTH_CHANGED, 7, changed, border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
-            
+
     pdf.output(pdf_file)
     print(f"PDF Report Generated: {pdf_file}")
+    return True
+
+def run_batch(lines):
+    # One work item per line: <playbook_json>\t<facts_json>\t<report_dir>.
+    # A bad item is reported and skipped; returns the number of failures.
+    failures = 0
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line.strip(): continue
+        fields = line.split('\t')
+        if len(fields) != 3:
+            print(f"Skipping malformed batch line: {line!r}")
+            failures += 1
+            continue
+        try:
+            ok = generate_report(*fields)
+        except Exception as e:
+            print(f"Error generating report for batch line {line!r}: {e}")
+            ok = False
+        if not ok:
+            failures += 1
+    return failures
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
+    if len(sys.argv) == 2 and sys.argv[1] == "--batch":
+        sys.exit(1 if run_batch(sys.stdin) else 0)
+
+    if len(sys.argv) < 4:
         print("Usage: python generate_pdf.py <playbook_json> <facts_json> <report_dir>")
+        print("       python generate_pdf.py --batch < work_items.tsv")
         sys.exit(1)
-        
+
     generate_report(sys.argv[1], sys.argv[2], sys.argv[3])
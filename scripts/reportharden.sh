@@ -67,5 +67,7 @@ fi
 echo ""
 echo "Files generated:"
 echo "- JSON Output: $REPORT_PATH/playbook_output.json"
-echo "- Unified JSON: $REPORT_PATH/final_report.json"
+if [ "${EMIT_JSON:-1}" != "0" ]; then
+    echo "- Unified JSON: $REPORT_PATH/final_report.json"
+fi
 echo "- PDF Report:  $REPORT_PATH/report.pdf"